@@ -0,0 +1,58 @@
+import os
+
+import numpy as np
+import pytest
+
+# Importing lightway.ingest requires the iss_xas_tools submodule
+cache = pytest.importorskip("lightway.ingest.cache")
+
+
+@pytest.fixture
+def entry(tmp_path):
+    path = tmp_path / "scan.dat"
+    path.write_text("# header\n1 2\n3 4\n")
+    metadata = {"Scan-uid": "abc"}
+    data = np.array([[1.0, 2.0], [3.0, 4.0]])
+    return path, metadata, "energy mu", data
+
+
+def test_hit(entry):
+    path, metadata, header, data = entry
+    assert cache.load_cached(path) is None
+    cache.save_cached(path, metadata, header, data)
+    cached = cache.load_cached(path)
+    assert cached[0] == metadata
+    assert cached[1] == header
+    assert isinstance(cached[2], np.memmap)
+    assert np.array_equal(cached[2], data)
+
+
+def test_miss_after_touch(entry):
+    path, metadata, header, data = entry
+    cache.save_cached(path, metadata, header, data)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert cache.load_cached(path) is None
+
+
+def test_miss_after_rewrite(entry):
+    path, metadata, header, data = entry
+    cache.save_cached(path, metadata, header, data)
+    stat = os.stat(path)
+    path.write_text("# header\n1 2\n3 4\n5 6\n")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert cache.load_cached(path) is None
+
+
+def test_cache_dir(entry, tmp_path):
+    path, metadata, header, data = entry
+    cache_dir = tmp_path / "elsewhere"
+    cache.save_cached(path, metadata, header, data, cache_dir=cache_dir)
+    names = sorted(p.name for p in cache_dir.iterdir())
+    assert len(names) == 2
+    digest = names[0].split("-")[0]
+    assert len(digest) == 16
+    assert names == [f"{digest}-scan.dat.json", f"{digest}-scan.dat.npy"]
+    assert not (path.parent / cache.DEFAULT_CACHE_DIRECTORY_NAME).exists()
+    assert cache.load_cached(path) is None
+    assert cache.load_cached(path, cache_dir=cache_dir) is not None
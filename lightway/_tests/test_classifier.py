@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("sklearn")
+pytest.importorskip("larch")
+pytest.importorskip("monty")
+pytest.importorskip("tiled")
+
+from lightway.postprocessing.classifier import (  # noqa: E402
+    XASQualityClassifier,
+    threshold_labels,
+)
+from lightway.postprocessing.operators import XASDataQuality  # noqa: E402
+
+
+class _Node:
+    def __init__(self, energy, mu):
+        self.item = {
+            "id": "node",
+            "attributes": {
+                "specs": [{"name": "ExperimentalXAS", "version": None}]
+            },
+        }
+        self.metadata = {"dataset": "raw"}
+        self._df = pd.DataFrame({"energy": energy, "mu": mu})
+
+    def read(self, columns=None):
+        return self._df if columns is None else self._df[columns]
+
+
+def _spectra(n, nx=400, seed=0):
+    """Good spectra, spectra which are mostly negative and spectra whose
+    tail is too large, in equal proportions."""
+
+    rng = np.random.default_rng(seed)
+    energy = np.linspace(8200.0, 9000.0, nx)
+    Y = []
+    for ii in range(n):
+        e0 = 8333.0 + rng.normal(scale=5.0)
+        mu = 1.0 / (1.0 + np.exp(-(energy - e0) / 3.0))
+        mu += rng.normal(scale=0.02, size=nx)
+        if ii % 3 == 1:
+            mu -= 0.6
+        elif ii % 3 == 2:
+            mu *= 2.0
+        Y.append(mu)
+    return energy, np.array(Y)
+
+
+def test_fit_and_round_trip(tmp_path):
+    _, Y = _spectra(300)
+    labels = threshold_labels(Y)
+    assert set(labels) == {"good", "ugly"}
+    classifier = XASQualityClassifier().fit(Y, labels)
+
+    _, Y_test = _spectra(60, seed=1)
+    predicted = classifier.predict(Y_test)
+    assert (predicted == threshold_labels(Y_test)).mean() > 0.95
+
+    path = tmp_path / "model.joblib"
+    classifier.save(path)
+    loaded = XASQualityClassifier.load(path)
+    assert np.array_equal(loaded.predict(Y_test), predicted)
+    assert np.allclose(
+        loaded.predict_proba(Y_test), classifier.predict_proba(Y_test)
+    )
+
+
+def test_threshold_labels_match_operator():
+    energy, Y = _spectra(30, seed=2)
+    operator = XASDataQuality()
+    expected = [operator(_Node(energy, mu))[1]["quality"] for mu in Y]
+    assert list(threshold_labels(Y)) == expected
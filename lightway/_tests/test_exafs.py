@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("larch")
+pytest.importorskip("monty")
+
+from lightway.postprocessing.operators import (  # noqa: E402
+    ETOK,
+    ExtractChi,
+    FourierTransformChi,
+)
+
+
+def _spectra(e0s, r=2.5, seed=0):
+    rng = np.random.default_rng(seed)
+    energy = np.linspace(8200.0, 9200.0, 2000)
+    Y = []
+    for e0 in e0s:
+        k = np.sqrt(np.clip(energy - e0, 0.0, None) * ETOK)
+        chi = 0.3 * np.sin(2.0 * r * k) / np.maximum(k, 1.0)
+        mu = 0.1 + 1e-5 * (energy - 8200.0) + (energy > e0) * (1.0 + chi)
+        Y.append(mu + rng.normal(scale=1e-3, size=energy.size))
+    return energy, np.array(Y)
+
+
+def test_independent_of_stack():
+    energy, Y = _spectra([8333.0, 8335.0, 8331.0])
+    extract = ExtractChi(kmax=14.0)
+    ft = FourierTransformChi()
+    k_alone, chi_alone = extract.batch(energy, Y[:1])
+    k_stack, chi_stack = extract.batch(energy, Y)
+    assert np.array_equal(k_alone, k_stack)
+    assert np.allclose(chi_alone[0], chi_stack[0])
+    r, chir = ft.batch(k_stack, chi_stack)
+    assert np.allclose(ft.batch(k_alone, chi_alone)[1][0], chir[0])
+    assert np.allclose(r[np.argmax(chir, axis=1)], 2.5, atol=0.1)
+
+
+def test_kmax_beyond_data():
+    energy, Y = _spectra([8333.0])
+    with pytest.raises(ValueError):
+        ExtractChi(kmax=30.0).batch(energy, Y)
+
+
+def test_empty_pre_edge():
+    energy, Y = _spectra([8333.0])
+    with pytest.raises(ValueError):
+        ExtractChi(kmax=14.0, pre1=-1000.0, pre2=-900.0).batch(energy, Y)
+
+
+def test_ft_grid_beyond_nfft():
+    energy, Y = _spectra([8333.0])
+    k, chi = ExtractChi(kmax=14.0, kstep=0.005).batch(energy, Y)
+    with pytest.raises(ValueError):
+        FourierTransformChi().batch(k, chi)
+
+
+def test_ft_grid_not_anchored():
+    energy, Y = _spectra([8333.0])
+    k, chi = ExtractChi(kmax=14.0).batch(energy, Y)
+    with pytest.raises(ValueError):
+        FourierTransformChi().batch(k + 0.01, chi)
@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("larch")
+pytest.importorskip("monty")
+pytest.importorskip("tiled")
+
+from tiled.queries import Key  # noqa: E402
+
+from lightway.postprocessing.execution import (  # noqa: E402
+    postprocess,
+    postprocess_stack,
+)
+from lightway.postprocessing.operators import (  # noqa: E402
+    ETOK,
+    ExtractChi,
+    FourierTransformChi,
+    StandardizeGrid,
+)
+
+
+class _Node:
+    def __init__(self, key, df, metadata, specs):
+        self.item = {
+            "id": key,
+            "attributes": {
+                "specs": [{"name": name, "version": None} for name in specs]
+            },
+        }
+        self.metadata = metadata
+        self._df = df
+
+    def read(self):
+        return self._df.copy()
+
+
+class _Client:
+    """In-memory stand-in for a Tiled container, supporting the equality
+    queries used by the execution module."""
+
+    def __init__(self, nodes=None):
+        self._nodes = dict(nodes or {})
+        self._counter = len(self._nodes)
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __getitem__(self, key):
+        return self._nodes[key]
+
+    def keys(self):
+        return list(self._nodes.keys())
+
+    def items(self):
+        return list(self._nodes.items())
+
+    def search(self, query):
+        return _Client(
+            {
+                key: node
+                for key, node in self._nodes.items()
+                if node.metadata.get(query.key) == query.value
+            }
+        )
+
+    def write_dataframe(self, df, metadata, specs):
+        key = f"node-{self._counter}"
+        self._counter += 1
+        self._nodes[key] = _Node(key, df, metadata, specs)
+        return self._nodes[key]
+
+
+def _raw_client(e0s=(8333.0, 8335.0)):
+    energy = np.linspace(8200.0, 9200.0, 1500)
+    client = _Client()
+    for e0 in e0s:
+        k = np.sqrt(np.clip(energy - e0, 0.0, None) * ETOK)
+        mu = 0.1 + (energy > e0) * (1.0 + 0.3 * np.sin(5.0 * k) / (k + 1.0))
+        client.write_dataframe(
+            pd.DataFrame({"energy": energy, "mu": mu}),
+            metadata={"dataset": "raw"},
+            specs=["ExperimentalXAS"],
+        )
+    return client
+
+
+def test_postprocess_twice():
+    client = _raw_client()
+    operators = [StandardizeGrid(x0=8250.0, xf=9150.0, nx=1000)]
+    first = postprocess(client, operators, pbar=False)
+    assert len(client) == 4
+    second = postprocess(client, operators, pbar=False)
+    assert len(client) == 4
+    assert second == first
+
+
+def test_postprocess_stack_twice():
+    client = _raw_client()
+    postprocess(
+        client, [StandardizeGrid(x0=8250.0, xf=9150.0, nx=1000)], pbar=False
+    )
+    operators = [ExtractChi(kmax=12.0), FourierTransformChi()]
+    queries = [Key("dataset") == "StandardizeGrid"]
+    first = postprocess_stack(client, operators, queries=queries, pbar=False)
+    assert len(client) == 6
+    second = postprocess_stack(client, operators, queries=queries, pbar=False)
+    assert len(client) == 6
+    assert second == first
+    for key in first:
+        parent = client[key].metadata["parent"]
+        assert client[parent].metadata["dataset"] == "StandardizeGrid"
@@ -0,0 +1,102 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("larch")
+pytest.importorskip("monty")
+
+from lightway.postprocessing.operators import (  # noqa: E402
+    MetadataOnlyUnaryOperatorOnNodeMixin,
+)
+
+
+class _PartitionedNode:
+    """Stand-in for a Tiled DataFrameClient split into partitions of 10
+    rows, which records the partitions and columns it was asked for."""
+
+    def __init__(self, npartitions=5):
+        self._partitions = [
+            pd.DataFrame(
+                {
+                    "energy": np.arange(10.0 * ii, 10.0 * (ii + 1)),
+                    "mu": np.full(10, float(ii)),
+                    "i0": np.ones(10),
+                }
+            )
+            for ii in range(npartitions)
+        ]
+        self.requests = []
+
+    def structure(self):
+        npartitions = len(self._partitions)
+        return SimpleNamespace(macro=SimpleNamespace(npartitions=npartitions))
+
+    def read(self, columns=None):
+        self.requests.append(("read", None, columns))
+        df = pd.concat(self._partitions)
+        return df if columns is None else df[columns]
+
+    def read_partition(self, partition, columns=None):
+        self.requests.append(("read_partition", partition, columns))
+        df = self._partitions[partition]
+        return df if columns is None else df[columns]
+
+
+class _Reader(MetadataOnlyUnaryOperatorOnNodeMixin):
+    requirements = []
+
+    def __init__(self, columns=None, partitions=None):
+        self._columns = columns
+        self._partitions = partitions
+
+    @property
+    def columns(self):
+        return self._columns
+
+    @property
+    def partitions(self):
+        return self._partitions
+
+    def _process_metadata(self, node):
+        return dict()
+
+
+def test_read_columns_only():
+    node = _PartitionedNode()
+    df = _Reader(columns=["mu"])._read(node)
+    assert list(df.columns) == ["mu"]
+    assert len(df) == 50
+    assert node.requests == [("read", None, ["mu"])]
+
+
+def test_read_everything():
+    node = _PartitionedNode()
+    df = _Reader()._read(node)
+    assert list(df.columns) == ["energy", "mu", "i0"]
+    assert len(df) == 50
+
+
+def test_read_slice():
+    node = _PartitionedNode()
+    df = _Reader(columns=["mu"], partitions=slice(-2, None))._read(node)
+    assert list(df.columns) == ["mu"]
+    assert np.array_equal(np.unique(df["mu"]), [3.0, 4.0])
+    assert node.requests == [
+        ("read_partition", 3, ["mu"]),
+        ("read_partition", 4, ["mu"]),
+    ]
+
+
+def test_read_negative_indices():
+    node = _PartitionedNode()
+    df = _Reader(partitions=[0, -1])._read(node)
+    assert list(df.columns) == ["energy", "mu", "i0"]
+    assert np.array_equal(np.unique(df["mu"]), [0.0, 4.0])
+    assert [request[1] for request in node.requests] == [0, 4]
+
+
+def test_read_out_of_range():
+    with pytest.raises(IndexError):
+        _Reader(partitions=[5])._read(_PartitionedNode())
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("sklearn")
+pytest.importorskip("joblib")
+
+from lightway.postprocessing.statistics import (  # noqa: E402
+    StreamingSpectraStatistics,
+)
+
+
+class _IdentityGrid:
+    """Stands in for StandardizeGrid on data already on the grid."""
+
+    def __init__(self, nx):
+        self.x0 = 0.0
+        self.xf = 1.0
+        self.nx = nx
+
+    def __call__(self, df, metadata):
+        return df, metadata
+
+
+METADATA = {"sample_metadata": {"element": "Ni", "edge": "K"}}
+
+
+def _stream(Y, **kwargs):
+    stats = StreamingSpectraStatistics(_IdentityGrid(Y.shape[1]), **kwargs)
+    for y in Y:
+        stats.update(pd.DataFrame({"mu": y}), METADATA)
+    stats.flush()
+    return stats
+
+
+@pytest.mark.parametrize("n", [3, 259, 600])
+def test_moments_match_numpy(n):
+    Y = np.random.default_rng(0).normal(size=(n, 20))
+    stats = _stream(Y, n_components=5, chunk_size=256)
+    assert stats.count("Ni_K") == n
+    assert np.allclose(stats.mean("Ni_K"), Y.mean(0))
+    assert np.allclose(stats.variance("Ni_K"), Y.var(0, ddof=1))
+
+
+def test_unfitted_group():
+    Y = np.random.default_rng(0).normal(size=(3, 20))
+    stats = _stream(Y, n_components=5, chunk_size=256)
+    with pytest.raises(ValueError):
+        stats.pca("Ni_K")
+    Y = np.random.default_rng(0).normal(size=(12, 20))
+    stats = _stream(Y, n_components=5, chunk_size=5)
+    # The last two spectra wait in the PCA buffer, but not in the moments
+    assert stats.pca("Ni_K").n_samples_seen_ == 10
+    assert stats.count("Ni_K") == 12
@@ -0,0 +1,274 @@
+"""Tiled adapters serving ISS data directly from disk, without requiring it
+to be ingested first."""
+
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import json
+import math
+import os
+from pathlib import Path
+import threading
+import time
+from uuid import NAMESPACE_URL, uuid5
+from warnings import warn
+
+import dask
+import dask.dataframe
+import pandas as pd
+from tiled.adapters.dataframe import DataFrameAdapter
+from tiled.adapters.mapping import MapAdapter
+from tiled.structures.core import Spec
+
+from lightway.ingest.cache import DEFAULT_CACHE_DIRECTORY_NAME, file_stat
+from lightway.ingest.iss import (
+    CHANNELS,
+    _to_tiled_metadata,
+    load_from_disk,
+    read_metadata_and_header,
+)
+
+
+class _ISSDirectoryMapping(Mapping):
+    """A lazy mapping from node keys to ``ExperimentalXAS`` DataFrame
+    adapters, one per channel of every ISS ``.dat`` file in a directory.
+
+    Only the headers of the files are read to build the mapping, in parallel,
+    and they are persisted in an index (by default inside the directory) so
+    that unchanged files are never read again. If the index cannot be written,
+    e.g. on a read-only mount, it is only kept in memory. The data itself is
+    parsed on demand and the most recently parsed files are kept in an LRU
+    cache. The directory is rescanned at most every ``refresh_interval``
+    seconds, so new files become available as soon as they land.
+    """
+
+    def __init__(
+        self,
+        directory,
+        *,
+        extension=".dat",
+        max_workers=None,
+        lru_size=128,
+        cache=False,
+        cache_dir=None,
+        index_path=None,
+        refresh_interval=10.0,
+    ):
+        self._directory = Path(directory)
+        self._extension = extension
+        self._max_workers = max_workers
+        self._cache = cache
+        self._cache_dir = cache_dir
+        self._refresh_interval = refresh_interval
+        if index_path is None:
+            index_path = (
+                self._directory
+                / DEFAULT_CACHE_DIRECTORY_NAME
+                / "header_index.json"
+            )
+        self._index_path = Path(index_path)
+        self._index_writable = True
+        self._index = self._load_index()
+        self._keys = dict()
+        self._adapters = dict()
+        self._last_refresh = -math.inf
+        self._lock = threading.Lock()
+        self._load = lru_cache(maxsize=lru_size)(self._load_uncached)
+
+    def _load_index(self):
+        try:
+            with open(self._index_path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return dict()
+
+    def _save_index(self):
+        if not self._index_writable:
+            return
+        tmp = self._index_path.with_name(f"{self._index_path.name}.tmp")
+        try:
+            self._index_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp, "w") as f:
+                json.dump(self._index, f)
+            os.replace(tmp, self._index_path)
+        except OSError as error:
+            self._index_writable = False
+            warn(
+                f"Could not write the header index to {self._index_path} "
+                f"({error}); it is only kept in memory. Use index_path to "
+                "store it elsewhere."
+            )
+
+    def _read_header(self, relative):
+        path = self._directory / relative
+        try:
+            metadata, _ = read_metadata_and_header(path, header_only=True)
+        except Exception as error:
+            # Most likely a file which is still being written; it will be
+            # indexed on the next refresh
+            warn(f"Could not read the header of {path}: {error}")
+            return None
+        if "Element-symbol" not in metadata or "Element-edge" not in metadata:
+            warn(f"{path} is missing the element or edge and is skipped")
+            return None
+        if "Scan-uid" not in metadata:
+            uid = uuid5(NAMESPACE_URL, str(path.resolve()))
+            metadata["Scan-uid"] = f"assigned-{uid}"
+        return metadata
+
+    def _is_fresh(self):
+        return time.monotonic() - self._last_refresh < self._refresh_interval
+
+    def _refresh(self):
+        if self._is_fresh():
+            return
+
+        with self._lock:
+            # Another thread may have refreshed while we waited for the lock
+            if self._is_fresh():
+                return
+
+            stats = {
+                path.relative_to(self._directory).as_posix(): file_stat(path)
+                for path in sorted(self._directory.rglob(f"*{self._extension}"))
+            }
+            stale = [
+                relative
+                for relative, stat in stats.items()
+                if self._index.get(relative, {}).get("stat") != stat
+            ]
+            removed = set(self._index.keys()) - set(stats.keys())
+
+            with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+                headers = list(executor.map(self._read_header, stale))
+
+            for relative in removed:
+                self._index.pop(relative)
+            for relative, metadata in zip(stale, headers):
+                self._index.pop(relative, None)
+                if metadata is not None:
+                    self._index[relative] = {
+                        "stat": stats[relative],
+                        "metadata": metadata,
+                    }
+            if stale or removed:
+                self._save_index()
+
+            # Tiled keys cannot contain "/"
+            keys = dict()
+            for relative in self._index.keys():
+                name = relative[: -len(self._extension)].replace("/", ".")
+                for channel in CHANNELS:
+                    keys[f"{name}-{channel}"] = (relative, channel)
+            changed = set(stale) | removed
+            self._adapters = {
+                key: adapter
+                for key, adapter in self._adapters.items()
+                if key in keys and keys[key][0] not in changed
+            }
+            self._keys = keys
+            self._last_refresh = time.monotonic()
+
+    def _load_uncached(self, relative, mtime_ns, size):
+        # The modification time and size are part of the LRU key, so that a
+        # modified file is parsed again
+        res = load_from_disk(
+            self._directory / relative,
+            cache=self._cache,
+            cache_dir=self._cache_dir,
+        )
+        return {r["metadata"]["channel"]: r["data"] for r in res}
+
+    def _read_channel(self, relative, channel):
+        stat = self._index[relative]["stat"]
+        return self._load(relative, stat["mtime_ns"], stat["size"])[channel]
+
+    def _make_adapter(self, relative, channel):
+        metadata = dict(self._index[relative]["metadata"])
+        ddf = dask.dataframe.from_delayed(
+            [dask.delayed(self._read_channel)(relative, channel)],
+            meta=pd.DataFrame({"energy": [], "mu": []}, dtype=float),
+            verify_meta=False,
+        )
+        return DataFrameAdapter.from_dask_dataframe(
+            ddf,
+            metadata=_to_tiled_metadata(metadata, channel),
+            specs=[Spec("ExperimentalXAS")],
+        )
+
+    def __getitem__(self, key):
+        self._refresh()
+        with self._lock:
+            if key not in self._adapters:
+                self._adapters[key] = self._make_adapter(*self._keys[key])
+            return self._adapters[key]
+
+    def __iter__(self):
+        self._refresh()
+        return iter(list(self._keys.keys()))
+
+    def __len__(self):
+        self._refresh()
+        return len(self._keys)
+
+
+class ISSDirectoryAdapter(MapAdapter):
+    """A read-only tree serving a directory of ISS ``.dat`` files directly,
+    without requiring them to be ingested first. Every channel
+    (transmission, fluorescence and reference) of every file is exposed as an
+    ``ExperimentalXAS`` DataFrame node."""
+
+    @classmethod
+    def from_directory(
+        cls,
+        directory,
+        *,
+        extension=".dat",
+        max_workers=None,
+        lru_size=128,
+        cache=False,
+        cache_dir=None,
+        index_path=None,
+        refresh_interval=10.0,
+        metadata=None,
+    ):
+        """Builds the tree.
+
+        Parameters
+        ----------
+        directory : os.PathLike
+        extension : str, optional
+        max_workers : int, optional
+            The number of threads used to read headers.
+        lru_size : int, optional
+            The number of parsed files kept in memory.
+        cache : bool, optional
+            If True, parsed files are also kept in the binary sidecar cache.
+            See :mod:`lightway.ingest.cache`.
+        cache_dir : os.PathLike, optional
+            Directory of the sidecar cache. By default, it is stored next to
+            the data; set this when the data directory is read-only.
+        index_path : os.PathLike, optional
+            Path of the persistent header index. By default, it is stored in
+            a hidden directory inside ``directory``; set this when the data
+            directory is read-only.
+        refresh_interval : float, optional
+            The minimum number of seconds between rescans of the directory.
+        metadata : dict, optional
+
+        Returns
+        -------
+        ISSDirectoryAdapter
+        """
+
+        mapping = _ISSDirectoryMapping(
+            directory,
+            extension=extension,
+            max_workers=max_workers,
+            lru_size=lru_size,
+            cache=cache,
+            cache_dir=cache_dir,
+            index_path=index_path,
+            refresh_interval=refresh_interval,
+        )
+        return cls(mapping, metadata=metadata)
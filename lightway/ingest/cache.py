@@ -0,0 +1,108 @@
+"""Binary sidecar cache of parsed ``.dat`` files. The numeric block of every
+file is stored as a ``.npy`` file (which can be memory-mapped), and the parsed
+metadata and header as JSON. Cache entries are invalidated whenever the
+modification time or size of the original file changes."""
+
+from hashlib import sha1
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+
+DEFAULT_CACHE_DIRECTORY_NAME = ".lightway_cache"
+
+
+def _cache_paths(path, cache_dir=None):
+    """Returns the paths of the data and metadata sidecar files of a file.
+
+    Parameters
+    ----------
+    path : os.PathLike
+    cache_dir : os.PathLike, optional
+        If None, the sidecar files are stored in a hidden directory next to
+        the original file. Otherwise, they are stored in ``cache_dir``, and
+        their names are prefixed by a hash of the full path of the original
+        file to avoid collisions between directories.
+
+    Returns
+    -------
+    tuple[pathlib.Path, pathlib.Path]
+    """
+
+    path = Path(path)
+    if cache_dir is None:
+        directory = path.parent / DEFAULT_CACHE_DIRECTORY_NAME
+        name = path.name
+    else:
+        directory = Path(cache_dir)
+        digest = sha1(str(path.resolve()).encode()).hexdigest()[:16]
+        name = f"{digest}-{path.name}"
+    return directory / f"{name}.npy", directory / f"{name}.json"
+
+
+def file_stat(path):
+    """Returns the modification time and size of a file, which together
+    identify its version."""
+
+    stat = os.stat(path)
+    return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def load_cached(path, cache_dir=None):
+    """Loads a parsed file from the cache, if it exists and is up to date.
+
+    Parameters
+    ----------
+    path : os.PathLike
+    cache_dir : os.PathLike, optional
+
+    Returns
+    -------
+    tuple[dict, str, numpy.ndarray] or None
+        The metadata, the header and the (memory-mapped) numeric block, or
+        None if there is no valid cache entry.
+    """
+
+    data_path, metadata_path = _cache_paths(path, cache_dir)
+    try:
+        with open(metadata_path, "r") as f:
+            entry = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    if entry["stat"] != file_stat(path) or not data_path.exists():
+        return None
+
+    data = np.load(data_path, mmap_mode="r")
+    return entry["metadata"], entry["header"], data
+
+
+def save_cached(path, metadata, header, data, cache_dir=None):
+    """Writes a parsed file to the cache. The data is written before the
+    metadata, and both are moved into place atomically, so that a partially
+    written entry is never considered valid.
+
+    Parameters
+    ----------
+    path : os.PathLike
+    metadata : dict
+    header : str
+    data : numpy.ndarray
+    cache_dir : os.PathLike, optional
+    """
+
+    data_path, metadata_path = _cache_paths(path, cache_dir)
+    data_path.parent.mkdir(parents=True, exist_ok=True)
+
+    tmp = data_path.with_name(f"{data_path.name}.tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, data)
+    os.replace(tmp, data_path)
+
+    entry = {"stat": file_stat(path), "metadata": metadata, "header": header}
+    tmp = metadata_path.with_name(f"{metadata_path.name}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(entry, f)
+    os.replace(tmp, metadata_path)
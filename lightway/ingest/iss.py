@@ -6,6 +6,7 @@ from uuid import uuid4
 import warnings
 
 
+from lightway.ingest.cache import load_cached, save_cached
 from lightway.ingest.validators import validate_iss
 
 
@@ -14,7 +15,10 @@ from lightway.ingest import xas  # noqa
 from xas.process import get_df_and_metadata_from_db
 
 
-def read_metadata_and_header(path):
+CHANNELS = ["transmission", "fluorescence", "reference"]
+
+
+def read_metadata_and_header(path, header_only=False):
     """Read through commented lines of dat file to get metadata and DataFrame
     header
 
@@ -22,6 +26,10 @@ def read_metadata_and_header(path):
     ----------
     path: str, or path object
         Path to .dat file from ISS beamline
+    header_only: bool, optional
+        If True, stops reading the file at the first line of data. This is
+        much faster for large files, and is valid as long as every commented
+        line precedes the data, as is the case for ISS files.
 
     Returns
     -------
@@ -33,11 +41,14 @@ def read_metadata_and_header(path):
     metadata: dict
     header: str
 
-    with open(path, "r") as dat_file:
-        lines = dat_file.readlines()
-
     # remove starting hash and whitespace
-    comment_lines = [line[2:] for line in lines if line.startswith("#")]
+    comment_lines = []
+    with open(path, "r") as dat_file:
+        for line in dat_file:
+            if line.startswith("#"):
+                comment_lines.append(line[2:])
+            elif header_only and line.strip():
+                break
 
     metadata = {
         # split line at colon for key-value pairs and strip whitespace from
@@ -100,7 +111,7 @@ def _process_df_and_metadata(df, metadata):
     return df_trans, md_trans, df_fluor, md_fluor, df_ref, md_ref
 
 
-def load_from_disk(path):
+def load_from_disk(path, cache=False, cache_dir=None):
     """Prepare scan data from Eli (ISS beamline) for entry into AIMMDB
 
     Data is stored in .dat file which contains commented lines (denoted by #)
@@ -121,6 +132,13 @@ def load_from_disk(path):
     ----------
     path: str, or path object
         path to .dat file from ISS beamline
+    cache: bool, optional
+        If True, the parsed file is read from (or written to) a binary
+        sidecar cache, which is invalidated whenever the file changes. See
+        :mod:`lightway.ingest.cache`.
+    cache_dir: str, or path object, optional
+        Directory of the cache. By default, the cache is stored in a hidden
+        directory next to the file.
 
     Returns
     -------
@@ -129,11 +147,24 @@ def load_from_disk(path):
         reference channels.
     """
 
-    metadata, hdr = read_metadata_and_header(path)
+    cached = load_cached(path, cache_dir) if cache else None
 
-    df = pd.read_csv(
-        path, delim_whitespace=True, comment="#", names=hdr.split()
-    )
+    if cached is None:
+        metadata, hdr = read_metadata_and_header(path)
+        df = pd.read_csv(
+            path, delim_whitespace=True, comment="#", names=hdr.split()
+        )
+        if cache:
+            try:
+                data = df.to_numpy(dtype=float)
+                save_cached(path, metadata, hdr, data, cache_dir)
+            except (OSError, TypeError, ValueError) as error:
+                # The cache is only an optimization, e.g. the data directory
+                # may be read-only, or a column may not be numeric
+                warnings.warn(f"Could not cache {path}: {error}")
+    else:
+        metadata, hdr, data = cached
+        df = pd.DataFrame(data, columns=hdr.split())
 
     (
         df_trans,
@@ -151,40 +182,63 @@ def load_from_disk(path):
     ]
 
 
+def _to_tiled_metadata(metadata, channel):
+    """Converts the metadata parsed from a file into that of an
+    ``ExperimentalXAS`` node.
+
+    Parameters
+    ----------
+    metadata : dict
+        The parsed metadata, which must contain a ``Scan-uid`` key.
+    channel : str
+
+    Returns
+    -------
+    dict
+    """
+
+    sample_metadata = {
+        "edge": metadata["Element-edge"],
+        "element": metadata["Element-symbol"],
+    }
+    return {
+        "original_sample_metadata": metadata,
+        "sample_metadata": sample_metadata,
+        "experiment_metadata": {
+            "facility": "NSLSII",
+            "beamline": "ISS",
+            "sample_id": metadata["Scan-uid"],
+            "channel": channel,
+        },
+        "dataset": "raw",
+    }
+
+
 def _write_from_res(res, client):
     for r in res:
-        sample_metadata = {
-            "edge": r["metadata"]["Element-edge"],
-            "element": r["metadata"]["Element-symbol"],
-        }
         channel = r["metadata"].pop("channel")
-        metadata = {
-            "original_sample_metadata": r["metadata"],
-            "sample_metadata": sample_metadata,
-            "experiment_metadata": {
-                "facility": "NSLSII",
-                "beamline": "ISS",
-                "sample_id": r["metadata"]["Scan-uid"],
-                "channel": channel,
-            },
-            "dataset": "raw",
-        }
+        metadata = _to_tiled_metadata(r["metadata"], channel)
         client.write_dataframe(
             r["data"], metadata=metadata, specs=["ExperimentalXAS"]
         )
 
 
-def ingest_all_from_disk(client, root, extension=".dat", pbar=True):
+def ingest_all_from_disk(
+    client, root, extension=".dat", pbar=True, cache=False, cache_dir=None
+):
     """Loads in all files matching the provided extension.
 
     Parameters
     ----------
     root : os.PathLike
+    cache : bool, optional
+        If True, uses the parsed-file cache. See :func:`load_from_disk`.
+    cache_dir : os.PathLike, optional
     """
 
     t = not pbar
     for path in tqdm(list(Path(root).rglob(f"*{extension}")), disable=t):
-        res = load_from_disk(path)
+        res = load_from_disk(path, cache=cache, cache_dir=cache_dir)
         _write_from_res(res, client)
 
 
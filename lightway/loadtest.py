@@ -0,0 +1,417 @@
+"""Load-test harness for a Tiled server running the Lightway validators and
+adapters. Starts a local server from a config file, runs a number of
+concurrent simulated ingest clients against it, and reports write and read
+latencies, throughput, and the CPU and memory use of the server.
+
+.. code::
+
+    python -m lightway.loadtest --clients 8 --writes-per-client 50
+
+.. note::
+
+    Server CPU and memory sampling requires ``psutil`` (the ``loadtest``
+    extra); it is skipped (with a warning) if ``psutil`` is not installed.
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+from multiprocessing import Manager
+import os
+from pathlib import Path
+import secrets
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from uuid import uuid4
+from warnings import warn
+
+import httpx
+import numpy as np
+import pandas as pd
+
+
+_ROOT = Path(__file__).parent.parent
+DEFAULT_CONFIG = _ROOT / "deploy" / "local" / "config.yml"
+DEFAULT_DATA = _ROOT / "real_example_data"
+
+
+def start_server(config, port, api_key, directory, timeout=60.0):
+    """Starts ``tiled serve config`` in a subprocess and waits until it
+    responds. The server is run from ``directory`` (e.g. a temporary
+    directory), so that any relative paths in the config do not touch the
+    working tree. Its output is logged to ``server.log`` in that directory,
+    and the end of the log is included in the error if it fails to start.
+
+    Parameters
+    ----------
+    config : os.PathLike
+    port : int
+    api_key : str
+    directory : os.PathLike
+    timeout : float, optional
+
+    Returns
+    -------
+    subprocess.Popen
+    """
+
+    env = {**os.environ, "TILED_SINGLE_USER_API_KEY": api_key}
+    log_path = Path(directory) / "server.log"
+    log = open(log_path, "w")
+    process = subprocess.Popen(
+        [
+            "tiled",
+            "serve",
+            "config",
+            str(Path(config).resolve()),
+            "--port",
+            str(port),
+        ],
+        cwd=directory,
+        env=env,
+        stdout=log,
+        stderr=subprocess.STDOUT,
+    )
+    log.close()
+
+    url = f"http://127.0.0.1:{port}/api/v1/"
+    t0 = time.monotonic()
+    while time.monotonic() - t0 < timeout:
+        if process.poll() is not None:
+            tail = log_path.read_text()[-2000:]
+            raise RuntimeError(
+                f"Tiled server exited with code {process.returncode}:\n{tail}"
+            )
+        try:
+            if httpx.get(url).status_code == 200:
+                return process
+        except httpx.TransportError:
+            pass
+        time.sleep(0.25)
+
+    process.terminate()
+    process.wait()
+    tail = log_path.read_text()[-2000:]
+    raise TimeoutError(
+        f"Tiled server did not start within {timeout} s:\n{tail}"
+    )
+
+
+def synthetic_workload(n, nx=500, seed=0):
+    """Generates synthetic K-edge spectra with valid ``ExperimentalXAS``
+    metadata.
+
+    Parameters
+    ----------
+    n : int
+    nx : int, optional
+    seed : int, optional
+
+    Returns
+    -------
+    list of tuple[pd.DataFrame, dict]
+    """
+
+    rng = np.random.default_rng(seed)
+    energy = np.linspace(8200.0, 9000.0, nx)
+    workload = []
+    for _ in range(n):
+        e0 = 8333.0 + rng.normal(scale=2.0)
+        mu = 1.0 / (1.0 + np.exp(-(energy - e0) / 2.0))
+        mu += rng.normal(scale=0.01, size=nx)
+        metadata = {
+            "sample_metadata": {"element": "Ni", "edge": "K"},
+            "experiment_metadata": {
+                "facility": "NSLSII",
+                "beamline": "ISS",
+                "sample_id": f"synthetic-{uuid4()}",
+                "channel": "transmission",
+            },
+            "dataset": "raw",
+        }
+        workload.append((pd.DataFrame({"energy": energy, "mu": mu}), metadata))
+    return workload
+
+
+def replay_workload(root, extension=".dat"):
+    """Loads every channel of every file in ``root``, exactly as
+    :func:`lightway.ingest.iss.ingest_all_from_disk` would write them.
+
+    Parameters
+    ----------
+    root : os.PathLike
+    extension : str, optional
+
+    Returns
+    -------
+    list of tuple[pd.DataFrame, dict]
+    """
+
+    from lightway.ingest.iss import _to_tiled_metadata, load_from_disk
+
+    workload = []
+    for path in sorted(Path(root).rglob(f"*{extension}")):
+        for r in load_from_disk(path):
+            channel = r["metadata"].pop("channel")
+            metadata = _to_tiled_metadata(r["metadata"], channel)
+            workload.append((r["data"], metadata))
+    return workload
+
+
+class _ServerMonitor(threading.Thread):
+    """Samples the CPU and memory use of the server process (and its
+    children) in the background."""
+
+    def __init__(self, pid, interval=0.5):
+        super().__init__(daemon=True)
+        import psutil
+
+        self._process = psutil.Process(pid)
+        self._interval = interval
+        self._stopped = threading.Event()
+        self.cpu_percent = []
+        self.rss = []
+
+    def _processes(self):
+        return [self._process, *self._process.children(recursive=True)]
+
+    def run(self):
+        for process in self._processes():
+            process.cpu_percent()
+        while not self._stopped.wait(self._interval):
+            processes = self._processes()
+            self.cpu_percent.append(sum(p.cpu_percent() for p in processes))
+            self.rss.append(sum(p.memory_info().rss for p in processes))
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+def _run_client(uri, api_key, workload, barrier):
+    """A single simulated ingest client, run in its own process: writes every
+    spectrum of its workload, then reads every one of them back. Every client
+    waits for the others at the barrier before each phase, so that writes and
+    reads are timed separately, and the time taken to start the process and
+    connect is excluded. Returns the latencies and the (wall clock) start and
+    end times of both phases."""
+
+    from lightway.client import from_uri
+
+    client = from_uri(uri, api_key=api_key)
+
+    barrier.wait()
+    nodes = []
+    write_latencies = []
+    write_start = time.time()
+    for df, metadata in workload:
+        t0 = time.perf_counter()
+        nodes.append(
+            client.write_dataframe(
+                df, metadata=metadata, specs=["ExperimentalXAS"]
+            )
+        )
+        write_latencies.append(time.perf_counter() - t0)
+    write_end = time.time()
+
+    barrier.wait()
+    read_latencies = []
+    read_start = time.time()
+    for node in nodes:
+        t0 = time.perf_counter()
+        node.read()
+        read_latencies.append(time.perf_counter() - t0)
+    read_end = time.time()
+
+    return {
+        "write": (write_latencies, write_start, write_end),
+        "read": (read_latencies, read_start, read_end),
+    }
+
+
+def _summarize(latencies):
+    latencies = np.array(latencies) * 1000.0
+    return {
+        "n": len(latencies),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def run_load_test(
+    uri,
+    api_key,
+    workload,
+    n_clients,
+    writes_per_client,
+    server_pid=None,
+    barrier_timeout=600.0,
+):
+    """Runs ``n_clients`` concurrent clients, each writing (and then reading
+    back) ``writes_per_client`` spectra drawn cyclically from the workload.
+    Every client runs in its own process, so that the load generator itself
+    is not limited by the GIL. The write and read phases are synchronized
+    across clients, and the latencies, wall time and throughput of each phase
+    are reported separately.
+
+    Parameters
+    ----------
+    uri : str
+    api_key : str
+    workload : list of tuple[pd.DataFrame, dict]
+    n_clients : int
+    writes_per_client : int
+    server_pid : int, optional
+        If provided (and ``psutil`` is installed), the CPU and memory use of
+        this process is sampled during the test.
+    barrier_timeout : float, optional
+        The number of seconds a client waits for the others to finish a
+        phase before giving up.
+
+    Returns
+    -------
+    dict
+    """
+
+    workloads = [
+        [
+            workload[(ii * writes_per_client + jj) % len(workload)]
+            for jj in range(writes_per_client)
+        ]
+        for ii in range(n_clients)
+    ]
+
+    monitor = None
+    if server_pid is not None:
+        try:
+            monitor = _ServerMonitor(server_pid)
+            monitor.start()
+        except ImportError:
+            warn("psutil is not installed; server resources are not sampled")
+
+    try:
+        with Manager() as manager:
+            barrier = manager.Barrier(n_clients, timeout=barrier_timeout)
+            with ProcessPoolExecutor(max_workers=n_clients) as executor:
+                results = list(
+                    executor.map(
+                        _run_client,
+                        [uri] * n_clients,
+                        [api_key] * n_clients,
+                        workloads,
+                        [barrier] * n_clients,
+                    )
+                )
+    finally:
+        if monitor is not None:
+            monitor.stop()
+
+    report = {"clients": n_clients}
+    for phase in ["write", "read"]:
+        latencies = [x for r in results for x in r[phase][0]]
+        wall = max(r[phase][2] for r in results) - min(
+            r[phase][1] for r in results
+        )
+        report[phase] = {
+            **_summarize(latencies),
+            "wall_time_s": wall,
+            "throughput_per_s": len(latencies) / wall,
+        }
+    if monitor is not None and monitor.cpu_percent:
+        report["server"] = {
+            "cpu_percent_mean": float(np.mean(monitor.cpu_percent)),
+            "cpu_percent_max": float(np.max(monitor.cpu_percent)),
+            "rss_mb_max": float(np.max(monitor.rss)) / 2**20,
+        }
+    return report
+
+
+def _print_report(report):
+    print(f"clients:          {report['clients']}")
+    for kind in ["write", "read"]:
+        s = report[kind]
+        print(
+            f"{kind + ' throughput:':<17} {s['throughput_per_s']:.1f} /s "
+            f"({s['n']} in {s['wall_time_s']:.2f} s)"
+        )
+        print(
+            f"{kind + ' latency:':<17} p50 {s['p50_ms']:.1f} ms, "
+            f"p95 {s['p95_ms']:.1f} ms, p99 {s['p99_ms']:.1f} ms"
+        )
+    if "server" in report:
+        s = report["server"]
+        print(
+            f"server:           cpu {s['cpu_percent_mean']:.0f}% mean, "
+            f"{s['cpu_percent_max']:.0f}% max, rss {s['rss_mb_max']:.0f} MB max"
+        )
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--config", default=str(DEFAULT_CONFIG))
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--writes-per-client", type=int, default=25)
+    parser.add_argument(
+        "--source", choices=["replay", "synthetic"], default="replay"
+    )
+    parser.add_argument(
+        "--data",
+        default=str(DEFAULT_DATA),
+        help="directory of .dat files replayed with --source replay",
+    )
+    parser.add_argument(
+        "--uri",
+        default=None,
+        help="test an already running server instead of starting one",
+    )
+    parser.add_argument(
+        "--api-key", default=os.environ.get("TILED_SINGLE_USER_API_KEY")
+    )
+    parser.add_argument(
+        "--json", default=None, help="also write the report to this file"
+    )
+    args = parser.parse_args(args)
+
+    if args.source == "replay":
+        workload = replay_workload(args.data)
+    else:
+        workload = synthetic_workload(args.clients * args.writes_per_client)
+
+    process = None
+    directory = None
+    api_key = args.api_key or secrets.token_hex(16)
+    uri = args.uri
+
+    try:
+        if uri is None:
+            directory = tempfile.mkdtemp(prefix="lightway-loadtest-")
+            process = start_server(args.config, args.port, api_key, directory)
+            uri = f"http://127.0.0.1:{args.port}"
+        report = run_load_test(
+            uri,
+            api_key,
+            workload,
+            args.clients,
+            args.writes_per_client,
+            server_pid=None if process is None else process.pid,
+        )
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        if directory is not None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    _print_report(report)
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
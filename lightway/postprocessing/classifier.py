@@ -0,0 +1,328 @@
+"""Module for learned quality assurance/quality control of spectra, as an
+alternative to the thresholds used by :class:`XASDataQuality`."""
+
+from time import perf_counter
+
+import joblib
+import numpy as np
+from sklearn.ensemble import HistGradientBoostingClassifier
+from sklearn.metrics import classification_report, confusion_matrix
+from tqdm import tqdm
+
+from lightway.postprocessing.execution import _write_results
+from lightway.postprocessing.operators import (
+    MetadataOnlyUnaryOperatorOnNodeMixin,
+)
+
+
+FEATURE_NAMES = [
+    "negative_fraction",
+    "tail_positive_fraction",
+    "mean",
+    "std",
+    "min",
+    "max",
+    "edge_jump",
+    "max_derivative",
+    "roughness",
+]
+
+
+def featurize(Y):
+    """Computes cheap, vectorized features of a stack of spectra. The first
+    two features are the quantities thresholded by :class:`XASDataQuality`.
+
+    Parameters
+    ----------
+    Y : numpy.ndarray
+        Spectra on a common grid, of shape ``(n_spectra, nx)``.
+
+    Returns
+    -------
+    numpy.ndarray
+        Features of shape ``(n_spectra, len(FEATURE_NAMES))``.
+    """
+
+    Y = np.atleast_2d(Y)
+    nx = Y.shape[1]
+    head = Y[:, : max(nx // 10, 1)]
+    tail = Y[:, -nx // 4 :]
+    d1 = np.diff(Y, axis=1)
+    d2 = np.diff(d1, axis=1)
+    std = Y.std(axis=1)
+    scale = np.where(std > 0.0, std, 1.0)
+    return np.stack(
+        [
+            (Y < 0.0).mean(axis=1),
+            (tail > 1.5).mean(axis=1),
+            Y.mean(axis=1),
+            std,
+            Y.min(axis=1),
+            Y.max(axis=1),
+            tail.mean(axis=1) - head.mean(axis=1),
+            np.abs(d1).max(axis=1) / scale,
+            np.abs(d2).mean(axis=1) / scale,
+        ],
+        axis=1,
+    )
+
+
+def threshold_labels(Y, negative_threshold=0.2, tail_positive_threshold=0.02):
+    """Vectorized version of the labels assigned by :class:`XASDataQuality`,
+    evaluated on a stack of spectra on a common grid.
+
+    .. warning::
+
+        :class:`XASDataQuality` thresholds the raw rows of every spectrum,
+        and the last quarter of the raw rows is generally not the last
+        quarter of a regridded spectrum. These labels therefore only match
+        the shipped ones if ``Y`` is on the same grid as the raw data. To
+        compare against the shipped labels, use the ``quality`` metadata
+        written by ``check_quality_`` instead.
+
+    Parameters
+    ----------
+    Y : numpy.ndarray
+    negative_threshold : float, optional
+    tail_positive_threshold : float, optional
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of ``"good"`` and ``"ugly"`` labels.
+    """
+
+    features = featurize(Y)
+    c1 = features[:, 0] > negative_threshold
+    c2 = features[:, 1] > tail_positive_threshold
+    return np.where(c1 | c2, "ugly", "good")
+
+
+class XASQualityClassifier:
+    """A learned classifier labeling spectra as "good", "bad" or "ugly". The
+    spectra are reduced to the features computed by :func:`featurize`, so
+    inference on a whole stack of spectra is a single vectorized call.
+
+    Parameters
+    ----------
+    estimator : sklearn estimator, optional
+        Any scikit-learn classifier. Defaults to a
+        :class:`HistGradientBoostingClassifier`.
+    """
+
+    def __init__(self, estimator=None):
+        if estimator is None:
+            estimator = HistGradientBoostingClassifier()
+        self.estimator = estimator
+
+    def fit(self, Y, labels):
+        """Fits the classifier.
+
+        Parameters
+        ----------
+        Y : numpy.ndarray
+            Spectra on a common grid, of shape ``(n_spectra, nx)``.
+        labels : array_like
+            One label per spectrum.
+
+        Returns
+        -------
+        XASQualityClassifier
+        """
+
+        self.estimator.fit(featurize(Y), np.asarray(labels))
+        return self
+
+    def predict(self, Y):
+        return self.estimator.predict(featurize(Y))
+
+    def predict_proba(self, Y):
+        return self.estimator.predict_proba(featurize(Y))
+
+    def save(self, path):
+        """Saves the model artifact to disk."""
+
+        joblib.dump(self, path)
+
+    @classmethod
+    def load(cls, path):
+        """Loads a model artifact previously written with :meth:`save`."""
+
+        return joblib.load(path)
+
+
+def benchmark_throughput(classifier, Y, repeats=5):
+    """Measures the batch inference throughput of the classifier, including
+    featurization.
+
+    Parameters
+    ----------
+    classifier : XASQualityClassifier
+    Y : numpy.ndarray
+        Spectra on a common grid, of shape ``(n_spectra, nx)``.
+    repeats : int, optional
+        The best of this many timings is reported.
+
+    Returns
+    -------
+    float
+        Spectra labeled per second.
+    """
+
+    best = np.inf
+    for _ in range(repeats):
+        t0 = perf_counter()
+        classifier.predict(Y)
+        best = min(best, perf_counter() - t0)
+    return Y.shape[0] / best
+
+
+def agreement_report(
+    classifier,
+    Y,
+    reference=None,
+    negative_threshold=0.2,
+    tail_positive_threshold=0.02,
+):
+    """Compares the labels of the classifier to reference labels, typically
+    those assigned by the threshold-based :class:`XASDataQuality`.
+
+    Parameters
+    ----------
+    classifier : XASQualityClassifier
+    Y : numpy.ndarray
+        Spectra on a common grid, of shape ``(n_spectra, nx)``.
+    reference : array_like, optional
+        One reference label per spectrum, e.g. the ``quality`` metadata
+        written by ``check_quality_``. If None, the labels are recomputed
+        from ``Y`` with :func:`threshold_labels`, which only reproduces
+        :class:`XASDataQuality` if ``Y`` is on the grid of the raw data.
+    negative_threshold : float, optional
+        Only used if ``reference`` is None.
+    tail_positive_threshold : float, optional
+        Only used if ``reference`` is None.
+
+    Returns
+    -------
+    dict
+        The fraction of spectra on which both agree, the confusion matrix
+        (rows are reference labels, columns are classifier labels) with its
+        labels, and a text report.
+    """
+
+    if reference is None:
+        reference = threshold_labels(
+            Y,
+            negative_threshold=negative_threshold,
+            tail_positive_threshold=tail_positive_threshold,
+        )
+    reference = np.asarray(reference)
+    predicted = classifier.predict(Y)
+    labels = sorted(set(reference) | set(predicted))
+    return {
+        "agreement": float((reference == predicted).mean()),
+        "labels": labels,
+        "confusion_matrix": confusion_matrix(
+            reference, predicted, labels=labels
+        ),
+        "report": classification_report(
+            reference, predicted, labels=labels, zero_division=0
+        ),
+    }
+
+
+class XASDataQualityML(MetadataOnlyUnaryOperatorOnNodeMixin):
+    """Label the spectrum as "good", "bad" or "ugly" using a saved
+    :class:`XASQualityClassifier`. Calling the operator labels a single node;
+    use :func:`label_collection` to label a whole collection with batched
+    inference.
+
+    Parameters
+    ----------
+    model_path : os.PathLike
+        Path to the model artifact.
+    grid_operator : StandardizeGrid
+        The operator putting the spectrum on the grid the model was trained
+        on.
+    """
+
+    @property
+    def requirements(self):
+        return [{"name": "ExperimentalXAS", "version": None}]
+
+    @property
+    def columns(self):
+        return [self.grid_operator.x_column, *self.grid_operator.y_columns]
+
+    def __init__(self, model_path, grid_operator):
+        self.model_path = str(model_path)
+        self.grid_operator = grid_operator
+        self._classifier = None
+
+    @property
+    def classifier(self):
+        if self._classifier is None:
+            self._classifier = XASQualityClassifier.load(self.model_path)
+        return self._classifier
+
+    def _process_metadata(self, node):
+        metadata = dict(node.metadata)
+        df, _ = self.grid_operator(self._read(node), metadata)
+        y = df[self.grid_operator.y_columns[0]].to_numpy()
+        metadata["quality"] = str(self.classifier.predict(y)[0])
+        return metadata
+
+
+def label_collection(client, operator, page_size=10000, pbar=True):
+    """Labels every node in a collection with an :class:`XASDataQualityML`
+    operator. The nodes are processed one page at a time: the gridded spectra
+    of a page are stacked and labeled with a single call to the classifier,
+    and the labels are then written back to the metadata of every node.
+
+    Parameters
+    ----------
+    client : tiled.client.node.Node
+    operator : XASDataQualityML
+    page_size : int, optional
+        The number of spectra labeled at once.
+    pbar : bool, optional
+
+    Returns
+    -------
+    list
+        The keys of the nodes that were labeled.
+    """
+
+    grid_operator = operator.grid_operator
+    column = grid_operator.y_columns[0]
+
+    keys = list(client.keys())
+    labeled = []
+    for start in tqdm(range(0, len(keys), page_size), disable=not pbar):
+        nodes = [client[key] for key in keys[start : start + page_size]]
+        metadatas = []
+        provenances = []
+        Y = []
+        for node in nodes:
+            # As for any in-place operator, the parent is not required
+            provenance = operator._preprocess(node)
+            provenance.pop("parent")
+            metadata = dict(node.metadata)
+            df, _ = grid_operator(operator._read(node), metadata)
+            Y.append(df[column].to_numpy())
+            metadatas.append(metadata)
+            provenances.append(provenance)
+
+        labels = operator.classifier.predict(np.array(Y))
+
+        results = []
+        for node, metadata, provenance, label in zip(
+            nodes, metadatas, provenances, labels
+        ):
+            metadata["quality"] = str(label)
+            metadata["operator_information"] = provenance
+            results.append(
+                {"key": node.item["id"], "data": None, "metadata": metadata}
+            )
+        labeled.extend(_write_results(client, results))
+    return labeled
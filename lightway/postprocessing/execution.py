@@ -0,0 +1,423 @@
+"""Module for executing chains of operators over entire Tiled collections,
+either in the caller's process or distributed over a Dask cluster."""
+
+from datetime import datetime
+import logging
+
+import numpy as np
+import pandas as pd
+from tiled.queries import Key
+from tqdm import tqdm
+
+from lightway.postprocessing.operators import (
+    MetadataOnlyUnaryOperatorOnNodeMixin,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+def _is_metadata_only(operators):
+    """Checks whether the chain of operators acts on the nodes in-place.
+    Chains of :class:`Operator` objects produce derived nodes, whereas a
+    single :class:`MetadataOnlyUnaryOperatorOnNodeMixin` (such as
+    :class:`XASDataQuality`) updates the metadata of the node it acts on.
+
+    Parameters
+    ----------
+    operators : list
+
+    Returns
+    -------
+    bool
+    """
+
+    metadata_only = [
+        isinstance(operator, MetadataOnlyUnaryOperatorOnNodeMixin)
+        for operator in operators
+    ]
+    if not any(metadata_only):
+        return False
+    if len(operators) > 1:
+        raise ValueError(
+            "Metadata-only operators act in-place and cannot be chained with "
+            "other operators; run them separately"
+        )
+    return True
+
+
+def _apply_operators(node, operators):
+    """Applies a chain of operators to a single node, without writing
+    anything back to the server.
+
+    Parameters
+    ----------
+    node : tiled.client.node.Node
+    operators : list
+
+    Returns
+    -------
+    dict
+        A result which can be written back with :func:`_write_results`.
+    """
+
+    if _is_metadata_only(operators):
+        _, metadata = operators[0](node)
+        return {"key": node.item["id"], "data": None, "metadata": metadata}
+
+    df = node.read()
+    metadata = dict(node.metadata).copy()
+    for operator in operators:
+        df, metadata = operator(df, metadata)
+
+    metadata = _with_provenance(metadata, operators, node.item["id"])
+    specs = [spec["name"] for spec in node.item["attributes"]["specs"]]
+    return {"key": None, "data": df, "metadata": metadata, "specs": specs}
+
+
+def _dataset_name(operators):
+    return "->".join([operator.__class__.__name__ for operator in operators])
+
+
+def _select_inputs(client, operators, queries=None):
+    """Selects the nodes of a collection a chain of operators acts on. Since
+    derived nodes are written back to the same collection, they must not be
+    picked up as inputs when the chain is run again.
+
+    Parameters
+    ----------
+    client : tiled.client.node.Node
+    operators : list
+    queries : list, optional
+        Tiled queries selecting the inputs, e.g. the derived nodes written by
+        a previous chain. If None, every node which was not itself derived
+        (i.e. has no ``parent``) is selected. In either case, the nodes
+        written by this very chain are never selected.
+
+    Returns
+    -------
+    list
+        The keys of the selected nodes.
+    """
+
+    selected = client
+    for query in queries or []:
+        selected = selected.search(query)
+
+    dataset = _dataset_name(operators)
+    keys = []
+    for key, node in selected.items():
+        metadata = node.metadata
+        if queries is None and "parent" in metadata:
+            continue
+        if metadata.get("dataset") == dataset:
+            continue
+        keys.append(key)
+    return keys
+
+
+def _with_provenance(metadata, operators, parent):
+    """Appends some specific postprocessing information to the metadata of a
+    derived node.
+
+    Parameters
+    ----------
+    metadata : dict
+    operators : list
+    parent : str
+        The key of the node the derived node was computed from.
+
+    Returns
+    -------
+    dict
+    """
+
+    dt = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+    return {
+        **metadata,
+        "operator_details": [operator.as_dict() for operator in operators],
+        "modified": dt,
+        "parent": parent,
+        "dataset": _dataset_name(operators),
+    }
+
+
+def _find_derived(client, metadata):
+    """Finds a node in the collection which was already derived from the same
+    parent by the same chain of operators (with the same parameters).
+
+    Parameters
+    ----------
+    client : tiled.client.node.Node
+    metadata : dict
+        The metadata of the derived node about to be written.
+
+    Returns
+    -------
+    str or None
+        The key of the existing node, if any.
+    """
+
+    candidates = client.search(Key("parent") == metadata["parent"]).search(
+        Key("dataset") == metadata["dataset"]
+    )
+    for key, node in candidates.items():
+        if node.metadata["operator_details"] == metadata["operator_details"]:
+            return key
+    return None
+
+
+def _write_results(client, results):
+    """Writes a batch of results produced by :func:`_apply_operators` back to
+    the collection. Writing is idempotent: a derived node is not written again
+    if the collection already contains one with the same parent and chain of
+    operators, so that a page can safely be retried.
+
+    Parameters
+    ----------
+    client : tiled.client.node.Node
+    results : list of dict
+
+    Returns
+    -------
+    list
+        The keys of the nodes that were updated, created or already present.
+    """
+
+    keys = []
+    for result in results:
+        if result["data"] is None:
+            client[result["key"]].update_metadata(result["metadata"])
+            keys.append(result["key"])
+            continue
+
+        key = _find_derived(client, result["metadata"])
+        if key is None:
+            new = client.write_dataframe(
+                result["data"],
+                metadata=result["metadata"],
+                specs=result["specs"],
+            )
+            key = new.item["id"]
+        keys.append(key)
+    return keys
+
+
+def postprocess(client, operators, queries=None, page_size=100, pbar=True):
+    """Applies a chain of operators to every node in a collection in the
+    caller's process. A chain of :class:`Operator` objects writes a new,
+    derived node for every input node, whereas a single metadata-only
+    operator updates every input node in-place.
+
+    Parameters
+    ----------
+    client : tiled.client.node.Node
+        The collection itself (not the result of a search), since it is also
+        where previously derived nodes are looked up. Use ``queries`` to
+        restrict the inputs.
+    operators : list
+    queries : list, optional
+        Tiled queries selecting the input nodes. By default, every node which
+        was not derived by a previous chain is processed. See
+        :func:`_select_inputs`.
+    page_size : int, optional
+        The number of nodes processed before their results are written back.
+    pbar : bool, optional
+
+    Returns
+    -------
+    list
+        The keys of the nodes that were updated or created.
+    """
+
+    # Freeze the keys up front, since derived nodes written back to the same
+    # collection would otherwise be processed as well
+    keys = _select_inputs(client, operators, queries)
+    new_keys = []
+    for start in tqdm(range(0, len(keys), page_size), disable=not pbar):
+        page = keys[start : start + page_size]
+        results = [_apply_operators(client[key], operators) for key in page]
+        new_keys.extend(_write_results(client, results))
+    return new_keys
+
+
+def postprocess_stack(
+    client, operators, queries=None, page_size=1000, pbar=True
+):
+    """Applies a chain of :class:`BatchOperator` objects (e.g.
+    :class:`ExtractChi` followed by :class:`FourierTransformChi`) to every
+    node in a collection. The nodes are processed one page at a time: the
+    spectra of a page are stacked and every operator acts on the whole stack
+    at once. A derived node, with provenance, is written for every node.
+
+    The spectra must already be on a common grid, for example the derived
+    nodes written by :func:`postprocess` with a :class:`StandardizeGrid`
+    operator, which are selected with ``queries``:
+
+    .. code::
+
+        postprocess_stack(
+            client,
+            [ExtractChi(kmax=14.0), FourierTransformChi()],
+            queries=[Key("dataset") == "StandardizeGrid"],
+        )
+
+    Derived nodes are written without specs, since their grid is no longer
+    the energy.
+
+    Parameters
+    ----------
+    client : tiled.client.node.Node
+        The collection itself (not the result of a search), since it is also
+        where previously derived nodes are looked up.
+    operators : list of BatchOperator
+    queries : list, optional
+        Tiled queries selecting the input nodes. See :func:`_select_inputs`.
+    page_size : int, optional
+        The number of spectra stacked (and written back) at once.
+    pbar : bool, optional
+
+    Returns
+    -------
+    list
+        The keys of the nodes that were created.
+    """
+
+    x_column = operators[0].x_column
+    columns = operators[0].y_columns
+
+    keys = _select_inputs(client, operators, queries)
+    new_keys = []
+    for start in tqdm(range(0, len(keys), page_size), disable=not pbar):
+        page = keys[start : start + page_size]
+        nodes = [client[key] for key in page]
+        dfs = [node.read() for node in nodes]
+
+        x = dfs[0][x_column].to_numpy()
+        for df in dfs[1:]:
+            if not np.array_equal(df[x_column].to_numpy(), x):
+                raise ValueError(
+                    "Every spectrum must be on the same grid; consider "
+                    "applying StandardizeGrid first"
+                )
+
+        # Stack every column of every node, shape (n_nodes * n_columns, nx)
+        Y = np.concatenate([df[columns].to_numpy().T for df in dfs])
+        for operator in operators:
+            x, Y = operator.batch(x, Y)
+
+        results = []
+        for ii, node in enumerate(nodes):
+            rows = Y[ii * len(columns) : (ii + 1) * len(columns)]
+            df = pd.DataFrame(
+                {operators[-1].new_x_column: x, **dict(zip(columns, rows))}
+            )
+            metadata = _with_provenance(
+                dict(node.metadata), operators, node.item["id"]
+            )
+            results.append(
+                {"key": None, "data": df, "metadata": metadata, "specs": []}
+            )
+        new_keys.extend(_write_results(client, results))
+    return new_keys
+
+
+def _process_page(uri, keys, operators, from_uri_kwargs):
+    """Runs on a Dask worker. Each worker opens its own connection to the
+    Tiled server, so only the node keys (and never the data) pass through the
+    scheduler. The results of the page are written back as one batch."""
+
+    from lightway.client import from_uri
+
+    client = from_uri(uri, **from_uri_kwargs)
+    results = [_apply_operators(client[key], operators) for key in keys]
+    return _write_results(client, results)
+
+
+def postprocess_dask(
+    uri,
+    operators,
+    *,
+    queries=None,
+    dask_client=None,
+    page_size=100,
+    retries=3,
+    pbar=True,
+    **from_uri_kwargs,
+):
+    """Same as :func:`postprocess`, but distributes the work over a Dask
+    cluster. The collection is split into pages of node keys, and every page
+    is processed and written back by a single task. Failed tasks are retried;
+    this is safe since writing back is idempotent (see
+    :func:`_write_results`), so nodes written before the failure are not
+    duplicated.
+
+    .. note::
+
+        Requires ``dask.distributed``. If no client is provided, a
+        :class:`distributed.LocalCluster` is started for the duration of the
+        call. The link to the cluster dashboard is logged at the INFO level
+        (and is available as ``dask_client.dashboard_link``) while the work
+        is running.
+
+    Parameters
+    ----------
+    uri : str
+        The URI of the collection to process. Every worker connects to it
+        directly.
+    operators : list
+    queries : list, optional
+        Tiled queries selecting the input nodes. See :func:`_select_inputs`.
+    dask_client : distributed.Client, optional
+    page_size : int, optional
+        The number of nodes processed (and written back) per task.
+    retries : int, optional
+        The number of times a failed task is retried before giving up.
+    pbar : bool, optional
+        If True, shows a progress bar for the submitted tasks.
+    **from_uri_kwargs
+        Passed to :func:`lightway.client.from_uri`, e.g. ``api_key``.
+
+    Returns
+    -------
+    list
+        The keys of the nodes that were updated or created.
+    """
+
+    from distributed import Client, LocalCluster, progress
+
+    from lightway.client import from_uri
+
+    keys = _select_inputs(from_uri(uri, **from_uri_kwargs), operators, queries)
+    pages = [
+        keys[start : start + page_size]
+        for start in range(0, len(keys), page_size)
+    ]
+
+    close = dask_client is None
+    if close:
+        dask_client = Client(LocalCluster())
+
+    try:
+        futures = [
+            dask_client.submit(
+                _process_page,
+                uri,
+                page,
+                operators,
+                from_uri_kwargs,
+                retries=retries,
+                pure=False,
+            )
+            for page in pages
+        ]
+        logger.info(f"Dask dashboard: {dask_client.dashboard_link}")
+        if pbar:
+            progress(futures)
+        results = dask_client.gather(futures)
+    finally:
+        if close:
+            dask_client.close()
+            dask_client.cluster.close()
+
+    return [key for page in results for key in page]
@@ -10,10 +10,13 @@ import pandas as pd
 # https://python-semver.readthedocs.io/en/stable/api.html#semver.match
 # import semver
 
-from scipy.interpolate import InterpolatedUnivariateSpline
+from scipy.interpolate import BSpline, InterpolatedUnivariateSpline
 from larch import Group as xafsgroup
 from larch.xafs import pre_edge
 
+# Conversion factor between energy (eV) and k^2 (1/Angstrom^2), 2 m_e / hbar^2
+ETOK = 0.2624682917
+
 
 class SpecsCompatibilityError(Exception):
     def __init__(self, node_spec_names, operator_spec_names):
@@ -120,6 +123,61 @@ class UnaryOperatorOnNodeMixin(MSONable, ABC):
 
         ...
 
+    @property
+    def columns(self):
+        """The columns of the node's DataFrame that the operator needs in
+        order to do its job. Only these columns are transferred from the
+        server when the operator reads the node. ``None`` (the default) means
+        that every column is required.
+
+        Returns
+        -------
+        list or None
+        """
+
+        return None
+
+    @property
+    def partitions(self):
+        """The partitions of the node's DataFrame that the operator needs in
+        order to do its job, as either a list of (possibly negative) partition
+        indices or a slice over them. Only these partitions are transferred
+        from the server when the operator reads the node. ``None`` (the
+        default) means that every row is required.
+
+        Returns
+        -------
+        list or slice or None
+        """
+
+        return None
+
+    def _read(self, node):
+        """Reads only the columns and partitions of the node declared by
+        :attr:`columns` and :attr:`partitions`.
+
+        Parameters
+        ----------
+        node : tiled.client.node.Node
+
+        Returns
+        -------
+        pd.DataFrame
+        """
+
+        if self.partitions is None:
+            return node.read(columns=self.columns)
+
+        indices = range(node.structure().macro.npartitions)
+        if isinstance(self.partitions, slice):
+            indices = indices[self.partitions]
+        else:
+            indices = [indices[ii] for ii in self.partitions]
+
+        return pd.concat(
+            [node.read_partition(ii, columns=self.columns) for ii in indices]
+        )
+
     def _assert_compatibility(self, node):
         # Get the current node's specs
         node_specs = node.item["attributes"]["specs"]
@@ -323,6 +381,292 @@ class NormalizeLarch(Operator):
         return pd.DataFrame(new_data)
 
 
+class BatchOperator(Operator, ABC):
+    """Base class for operators acting on a whole stack of spectra sharing a
+    common grid at once. Derived classes implement :meth:`_process_stack`,
+    which should be vectorized over the stack. A single DataFrame is treated
+    as a stack of its ``y_columns``.
+
+    .. important::
+
+        Derived classes must set the ``x_column`` and ``y_columns``
+        attributes, and the ``new_x_column`` class attribute naming the grid
+        of the output.
+    """
+
+    new_x_column = None
+
+    @abstractmethod
+    def _process_stack(self, x, Y):
+        """Processes a stack of spectra.
+
+        Parameters
+        ----------
+        x : numpy.ndarray
+            The common grid, of shape ``(nx,)``.
+        Y : numpy.ndarray
+            The spectra, of shape ``(n_spectra, nx)``.
+
+        Returns
+        -------
+        tuple[numpy.ndarray, numpy.ndarray]
+            The new grid and the processed spectra.
+        """
+
+        ...
+
+    def batch(self, x, Y):
+        return self._process_stack(
+            np.asarray(x, dtype=float), np.atleast_2d(np.asarray(Y, float))
+        )
+
+    def _process_data(self, df, _):
+        Y = df[self.y_columns].to_numpy().T
+        new_x, new_Y = self.batch(df[self.x_column].to_numpy(), Y)
+        new_data = {self.new_x_column: new_x}
+        new_data.update(dict(zip(self.y_columns, new_Y)))
+        return pd.DataFrame(new_data)
+
+
+def _masked_linear_fit(x, Y, mask, region):
+    """Fits a line to every spectrum of the stack, using only the points
+    selected by the corresponding row of the mask. Returns the slopes and
+    intercepts. Raises a ValueError if any row selects fewer than two
+    points."""
+
+    w = mask.astype(float)
+    s0 = w.sum(axis=1)
+    if (s0 < 2).any():
+        raise ValueError(
+            f"The {region} fit range contains fewer than two points for "
+            f"spectra {np.flatnonzero(s0 < 2).tolist()}"
+        )
+    sx = (w * x).sum(axis=1)
+    sxx = (w * x**2).sum(axis=1)
+    sy = (w * Y).sum(axis=1)
+    sxy = (w * x * Y).sum(axis=1)
+    slope = (s0 * sxy - sx * sy) / (s0 * sxx - sx**2)
+    intercept = (sy - slope * sx) / s0
+    return slope, intercept
+
+
+def _interp_rows(x, Y, X):
+    """Linear interpolation of every row of ``Y`` (sampled on the common grid
+    ``x``) at the points of the corresponding row of ``X``."""
+
+    idx = np.clip(np.searchsorted(x, X) - 1, 0, len(x) - 2)
+    if X.max() > x[-1] or X.min() < x[0]:
+        raise ValueError(
+            f"Cannot interpolate at {X.min()} to {X.max()}, outside of the "
+            f"grid ({x[0]} to {x[-1]})"
+        )
+    x0 = x[idx]
+    x1 = x[idx + 1]
+    y0 = np.take_along_axis(Y, idx, axis=1)
+    y1 = np.take_along_axis(Y, idx + 1, axis=1)
+    return y0 + (y1 - y0) * (X - x0) / (x1 - x0)
+
+
+class ExtractChi(BatchOperator):
+    """Extracts the EXAFS :math:`\\chi(k)` from a stack of spectra on a common
+    energy grid. This is a vectorized analog of larch's ``pre_edge`` and
+    ``autobk``:
+
+       1. determine E0 (if not supplied) from max of deriv(mu)
+       2. fit lines to the pre-edge and post-edge regions, and take their
+          difference at E0 as the edge step
+       3. interpolate the pre-edge subtracted spectra onto a common
+          :math:`k` grid
+       4. fit a cubic B-spline background with knots spaced according to
+          ``rbkg`` to every spectrum at once (the spline basis is shared by
+          the whole stack, so this is a single least-squares solve)
+       5. :math:`\\chi(k) = (\\mu(k) - \\mu_0(k)) / \\Delta\\mu`
+
+    Parameters
+    ----------
+    x_column : str, optional
+        References the energy column. Default is "energy".
+    y_columns : list, optional
+        References the columns to process. Default is ["mu"]. The output
+        keeps the same column names, on a grid named "k".
+    e0 : float, optional
+        The edge energy. If None, it is determined for every spectrum.
+    pre1, pre2 : float, optional
+        The pre-edge fit range, relative to E0 (in eV).
+    norm1, norm2 : float, optional
+        The post-edge fit range, relative to E0 (in eV). If ``norm2`` is None,
+        the range extends to the end of the grid.
+    rbkg : float, optional
+        The distance (in Angstrom) below which the background is removed.
+    kmax : float
+        The end of the :math:`k` grid. It is required, so that the grid does
+        not depend on which spectra are processed together. A ValueError is
+        raised for spectra which do not extend up to ``kmax``.
+    kstep : float, optional
+        The spacing of the :math:`k` grid.
+    kweight : float, optional
+        The :math:`k` weight used when fitting the background.
+    """
+
+    new_x_column = "k"
+
+    def __init__(
+        self,
+        *,
+        x_column="energy",
+        y_columns=["mu"],
+        e0=None,
+        pre1=-150.0,
+        pre2=-30.0,
+        norm1=150.0,
+        norm2=None,
+        rbkg=1.0,
+        kmax,
+        kstep=0.05,
+        kweight=1.0,
+    ):
+        self.x_column = x_column
+        self.y_columns = y_columns
+        self.e0 = e0
+        self.pre1 = pre1
+        self.pre2 = pre2
+        self.norm1 = norm1
+        self.norm2 = norm2
+        self.rbkg = rbkg
+        self.kmax = kmax
+        self.kstep = kstep
+        self.kweight = kweight
+
+    def _process_stack(self, x, Y):
+        n = Y.shape[0]
+        if self.e0 is None:
+            e0 = x[np.argmax(np.gradient(Y, x, axis=1), axis=1)]
+        else:
+            e0 = np.full(n, float(self.e0))
+
+        # Edge step from the pre- and post-edge lines, evaluated at E0
+        rel = x - e0[:, None]
+        pre = (rel >= self.pre1) & (rel <= self.pre2)
+        norm2 = np.inf if self.norm2 is None else self.norm2
+        post = (rel >= self.norm1) & (rel <= norm2)
+        pre_slope, pre_intercept = _masked_linear_fit(x, Y, pre, "pre-edge")
+        post_slope, post_intercept = _masked_linear_fit(x, Y, post, "post-edge")
+        pre_line = pre_slope[:, None] * x + pre_intercept[:, None]
+        edge_step = (post_slope - pre_slope) * e0 + (
+            post_intercept - pre_intercept
+        )
+        edge_step = np.where(edge_step != 0.0, edge_step, 1.0)
+
+        # Common k grid, and the energy of each of its points per spectrum
+        emax = e0.max() + self.kmax**2 / ETOK
+        if emax > x[-1]:
+            raise ValueError(
+                f"kmax={self.kmax} requires data up to {emax:.1f} eV, but "
+                f"the grid ends at {x[-1]:.1f} eV"
+            )
+        k = np.arange(0.0, self.kmax + self.kstep / 2.0, self.kstep)
+        k = k[k <= self.kmax]
+        mu_k = _interp_rows(x, Y - pre_line, e0[:, None] + k**2 / ETOK)
+
+        # Shared cubic B-spline basis for the background
+        nknots = max(int(2.0 * self.rbkg * (k[-1] - k[0]) / np.pi) + 1, 2)
+        knots = np.linspace(k[0], k[-1], nknots)
+        t = np.concatenate([[k[0]] * 3, knots, [k[-1]] * 3])
+        basis = BSpline.design_matrix(k, t, 3).toarray()
+        w = np.maximum(k, self.kstep) ** self.kweight
+        coef, *_ = np.linalg.lstsq(basis * w[:, None], (mu_k * w).T, rcond=None)
+        bkg = (basis @ coef).T
+
+        return k, (mu_k - bkg) / edge_step[:, None]
+
+
+class FourierTransformChi(BatchOperator):
+    """Computes :math:`|\\chi(R)|`, the magnitude of the windowed Fourier
+    transform of :math:`k^w \\chi(k)`, for a stack of spectra on a common,
+    uniform :math:`k` grid (e.g. the output of :class:`ExtractChi`). The
+    transform of the whole stack is a single call to :func:`numpy.fft.fft`,
+    and follows the conventions of larch's ``xftf``.
+
+    Parameters
+    ----------
+    x_column : str, optional
+        References the :math:`k` column. Default is "k".
+    y_columns : list, optional
+        References the :math:`\\chi(k)` columns. Default is ["mu"]. The
+        output keeps the same column names, on a grid named "r".
+    kweight : float, optional
+    kmin, kmax : float, optional
+        The range of the window. If ``kmax`` is None, it is the end of the
+        :math:`k` grid, which is shared by the whole collection (for
+        :class:`ExtractChi`, it is set by its ``kmax``).
+    dk : float, optional
+        The width of the tapered edges of the Hanning window.
+    nfft : int, optional
+        The number of points of the (zero-padded) transform. Must exceed
+        ``kmax / kstep``.
+    rmax : float, optional
+        The end of the :math:`R` grid (in Angstrom).
+    """
+
+    new_x_column = "r"
+
+    def __init__(
+        self,
+        *,
+        x_column="k",
+        y_columns=["mu"],
+        kweight=2.0,
+        kmin=2.0,
+        kmax=None,
+        dk=1.0,
+        nfft=2048,
+        rmax=10.0,
+    ):
+        self.x_column = x_column
+        self.y_columns = y_columns
+        self.kweight = kweight
+        self.kmin = kmin
+        self.kmax = kmax
+        self.dk = dk
+        self.nfft = nfft
+        self.rmax = rmax
+
+    def _window(self, k):
+        kmax = k[-1] if self.kmax is None else self.kmax
+        x1, x2 = self.kmin - self.dk / 2.0, self.kmin + self.dk / 2.0
+        x3, x4 = kmax - self.dk / 2.0, kmax + self.dk / 2.0
+        rise = np.sin(np.pi / 2.0 * np.clip((k - x1) / (x2 - x1), 0, 1)) ** 2
+        fall = np.cos(np.pi / 2.0 * np.clip((k - x3) / (x4 - x3), 0, 1)) ** 2
+        return rise * fall
+
+    def _process_stack(self, k, Y):
+        kstep = k[1] - k[0]
+        if not np.allclose(np.diff(k), kstep):
+            raise ValueError("The k grid must be uniform")
+
+        # Place the data on a grid starting at k = 0, zero-padded to nfft
+        idx = np.rint(k / kstep).astype(int)
+        if not np.allclose(idx * kstep, k, rtol=0.0, atol=1e-3 * kstep):
+            raise ValueError(
+                "Every k of the grid must be a multiple of the step, i.e. the "
+                "grid must be anchored at k = 0"
+            )
+        if idx.max() >= self.nfft:
+            raise ValueError(
+                f"The k grid needs {idx.max() + 1} points at a step of "
+                f"{kstep}, more than nfft={self.nfft}; increase nfft or kstep"
+            )
+        buffer = np.zeros((Y.shape[0], self.nfft))
+        buffer[:, idx] = Y * self._window(k) * k**self.kweight
+        cchi = np.fft.fft(buffer, axis=1)[:, : self.nfft // 2]
+        cchi *= kstep / np.sqrt(np.pi)
+
+        rstep = np.pi / (kstep * self.nfft)
+        r = rstep * np.arange(self.nfft // 2)
+        keep = r <= self.rmax
+        return r[keep], np.abs(cchi[:, keep])
+
+
 class XASDataQuality(MetadataOnlyUnaryOperatorOnNodeMixin):
     """Label the spectrum as "good", "bad" or "ugly"."""
 
@@ -334,8 +678,15 @@ class XASDataQuality(MetadataOnlyUnaryOperatorOnNodeMixin):
         self._negative_threshold = negative_threshold
         self._tail_positive_threshold = tail_positive_threshold
 
+    @property
+    def columns(self):
+        # The quality checks only ever look at mu. Note that the tail check
+        # is relative to the full length of the spectrum and the negative
+        # check covers every row, so all partitions are still required.
+        return ["mu"]
+
     def _process_metadata(self, node):
-        df = node.read()
+        df = self._read(node)
         metadata = dict(node.metadata)
         c1 = (df["mu"].to_numpy() < 0.0).mean() > self._negative_threshold
         mu = (df["mu"].to_numpy()[-len(df.index) // 4 :] > 1.5).mean()
@@ -350,20 +701,3 @@ class XASDataQuality(MetadataOnlyUnaryOperatorOnNodeMixin):
 # # TODO
 # class PreNormalize(Operator):
 #     ...
-
-
-# def postprocess(client, operators=[], pbar=True):
-#     operators_string = "->".join([xx.__class__.__name__ for xx in operators])
-#     operators_details = [operator.as_dict() for operator in operators]
-#     for parent_uid, node in tqdm(client.items(), disable=not pbar):
-#         df = node.read()
-#         new_metadata = dict(node.metadata).copy()
-#         for operator in operators:
-#             df, new_metadata = operator(df, new_metadata)
-
-#         # Append some specific postprocessing information to the results
-#         dt = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-#         new_metadata["operator_details"] = operators_details
-#         new_metadata["modified"] = dt
-#         new_metadata["dataset"] = operators_string
-#         client.write_dataframe(df, metadata=new_metadata)
@@ -0,0 +1,239 @@
+"""Module for computing collection-wide statistics of spectra in a streaming
+fashion, i.e. without ever loading an entire collection into memory."""
+
+import os
+from pathlib import Path
+
+import joblib
+import numpy as np
+from sklearn.decomposition import IncrementalPCA
+from tqdm import tqdm
+
+
+def _default_group(metadata):
+    sample_metadata = metadata["sample_metadata"]
+    return f"{sample_metadata['element']}_{sample_metadata['edge']}"
+
+
+class _GroupStatistics:
+    """Running moments and PCA basis of a single group of spectra. The
+    moments are updated chunk by chunk using the parallel form of Welford's
+    algorithm (Chan et al.), which is numerically stable and exact."""
+
+    def __init__(self, nx, n_components):
+        self.count = 0
+        self.mean = np.zeros(nx)
+        self.m2 = np.zeros(nx)
+        self.pca = IncrementalPCA(n_components=n_components)
+        self.buffer = []
+        self.pca_buffer = []
+
+    def _update_moments(self, Y):
+        n_b = Y.shape[0]
+        mean_b = Y.mean(axis=0)
+        m2_b = ((Y - mean_b) ** 2).sum(axis=0)
+        n = self.count + n_b
+        delta = mean_b - self.mean
+        self.mean = self.mean + delta * n_b / n
+        self.m2 = self.m2 + m2_b + delta**2 * self.count * n_b / n
+        self.count = n
+
+    @property
+    def fitted(self):
+        return hasattr(self.pca, "components_")
+
+    def flush(self):
+        """Folds the buffered spectra into the moments. IncrementalPCA
+        requires at least n_components samples per chunk, so the spectra are
+        kept in a separate PCA buffer until there are enough of them."""
+
+        if self.buffer:
+            Y = np.array(self.buffer)
+            self._update_moments(Y)
+            self.pca_buffer.extend(self.buffer)
+            self.buffer = []
+        if len(self.pca_buffer) >= self.pca.n_components:
+            self.pca.partial_fit(np.array(self.pca_buffer))
+            self.pca_buffer = []
+
+    def add(self, y, chunk_size):
+        self.buffer.append(y)
+        if len(self.buffer) >= chunk_size:
+            self.flush()
+
+
+class StreamingSpectraStatistics:
+    """Accumulates the mean spectrum, variance and a PCA basis of every group
+    (by default, every element/edge pair) in a collection. Spectra are first
+    interpolated onto a common grid with a :class:`StandardizeGrid` operator,
+    then buffered and folded into the running statistics chunk by chunk, so
+    the memory footprint does not depend on the size of the collection.
+
+    The state can be checkpointed to disk and the computation resumed from
+    the last checkpoint, provided that the order of the nodes in the
+    collection (or query) has not changed in between.
+
+    Parameters
+    ----------
+    grid_operator : StandardizeGrid
+        The operator used to put every spectrum onto a common grid.
+    column : str, optional
+        The column of the gridded DataFrame to accumulate statistics on.
+    n_components : int, optional
+        The number of PCA components to keep for every group.
+    chunk_size : int, optional
+        The number of spectra per group buffered before the running statistics
+        are updated. Must be at least ``n_components``.
+    group_by : callable, optional
+        Maps the metadata of a node to the name of its group. Defaults to
+        ``"{element}_{edge}"``.
+    """
+
+    def __init__(
+        self,
+        grid_operator,
+        *,
+        column="mu",
+        n_components=5,
+        chunk_size=256,
+        group_by=_default_group,
+    ):
+        if chunk_size < n_components:
+            raise ValueError(
+                f"chunk_size ({chunk_size}) must be at least n_components "
+                f"({n_components})"
+            )
+        self.grid_operator = grid_operator
+        self.column = column
+        self.n_components = n_components
+        self.chunk_size = chunk_size
+        self.group_by = group_by
+        self.position = 0
+        self._groups = dict()
+
+    @property
+    def grid(self):
+        return np.linspace(
+            self.grid_operator.x0, self.grid_operator.xf, self.grid_operator.nx
+        )
+
+    @property
+    def groups(self):
+        return list(self._groups.keys())
+
+    def update(self, df, metadata):
+        """Adds a single spectrum to the statistics.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+        metadata : dict
+        """
+
+        group = self.group_by(metadata)
+        if group not in self._groups:
+            self._groups[group] = _GroupStatistics(
+                self.grid_operator.nx, self.n_components
+            )
+        df, _ = self.grid_operator(df, metadata)
+        y = df[self.column].to_numpy()
+        self._groups[group].add(y, self.chunk_size)
+
+    def flush(self):
+        """Folds every buffered spectrum into the running moments. Groups
+        with fewer than ``n_components`` spectra not yet seen by the PCA keep
+        them buffered for the PCA until more arrive."""
+
+        for group in self._groups.values():
+            group.flush()
+
+    def run(self, client, checkpoint=None, checkpoint_every=1000, pbar=True):
+        """Streams every node of the client (e.g. the result of a Tiled
+        query) through :meth:`update`, starting from the position reached by
+        a previous run.
+
+        Parameters
+        ----------
+        client : tiled.client.node.Node
+        checkpoint : os.PathLike, optional
+            If provided, the state is saved to this path every
+            ``checkpoint_every`` spectra and at the end of the run.
+        checkpoint_every : int, optional
+        pbar : bool, optional
+        """
+
+        n = len(client)
+        items = client.items()[self.position :]
+        for _, node in tqdm(items, total=n - self.position, disable=not pbar):
+            self.update(node.read(), dict(node.metadata))
+            self.position += 1
+            if checkpoint is not None and self.position % checkpoint_every == 0:
+                self.save(checkpoint)
+        self.flush()
+        if checkpoint is not None:
+            self.save(checkpoint)
+
+    def count(self, group):
+        return self._groups[group].count
+
+    def mean(self, group):
+        stats = self._groups[group]
+        if stats.count == 0:
+            return np.full_like(stats.mean, np.nan)
+        return stats.mean
+
+    def variance(self, group):
+        stats = self._groups[group]
+        if stats.count < 2:
+            return np.full_like(stats.mean, np.nan)
+        return stats.m2 / (stats.count - 1)
+
+    def std(self, group):
+        return np.sqrt(self.variance(group))
+
+    def pca(self, group):
+        """Returns the fitted :class:`IncrementalPCA` of the group. Raises a
+        ValueError if the group has fewer than ``n_components`` spectra, in
+        which case the PCA has not been fitted yet."""
+
+        stats = self._groups[group]
+        if not stats.fitted:
+            raise ValueError(
+                f"The PCA of group {group} has not been fitted yet: it needs "
+                f"at least {self.n_components} spectra"
+            )
+        return stats.pca
+
+    def reconstruction_error(self, group, Y):
+        """Computes the root-mean-square error of reconstructing each of the
+        spectra using the PCA basis of the group. Spectra that are poorly
+        described by the basis are likely outliers.
+
+        Parameters
+        ----------
+        group : str
+        Y : numpy.ndarray
+            Spectra on the common grid, of shape ``(n_spectra, nx)``.
+
+        Returns
+        -------
+        numpy.ndarray
+        """
+
+        pca = self.pca(group)
+        Y_hat = pca.inverse_transform(pca.transform(Y))
+        return np.sqrt(((Y - Y_hat) ** 2).mean(axis=1))
+
+    def save(self, path):
+        """Atomically writes the current state to disk."""
+
+        path = Path(path)
+        tmp = path.with_name(f"{path.name}.tmp")
+        joblib.dump(self, tmp)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """Loads a state previously written with :meth:`save`."""
+
+        return joblib.load(path)